@@ -1,9 +1,14 @@
 import yfinance as yf
 import pandas as pd
 import numpy as np
-import json
+import bottleneck as bn
+from numba import njit
+import orjson
+import re
 import os
+import time
 from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
 
 # ==========================================
 # 1. CONFIGURATION
@@ -20,18 +25,65 @@ FIXED_RISK_FREE_RATE = 0.04
 BROKER_SPREAD = 0.005 / 252   
 DAILY_EXPENSE = 0.011 / 252   
 
+# Local price cache (one parquet file per ticker)
+# TTL stays below the gap between scheduled runs so intraday updates still refresh
+CACHE_DIR = 'cache'
+CACHE_TTL_HOURS = 1
+
 # ==========================================
 # 2. ROBUST DATA ENGINE
 # ==========================================
+# Fused per-day pipeline. Only nnan/ninf are left out of fastmath: the
+# splice below relies on NaN checks to find days without real ETF data.
+# The explicit signature compiles it eagerly; cache=True keeps the machine
+# code in __pycache__ so later runs skip the JIT step.
+@njit('void(f8[::1], f8[::1], f8[::1], f8[::1], f8, f8[:, ::1])',
+      cache=True, boundscheck=False, fastmath={'nsz', 'arcp', 'contract', 'afn', 'reassoc'})
+def compute_pipeline(price, sma, sso_real, upro_real, rf_rate, out):
+    n = len(price)
+    eq_2x = out[0]
+    eq_3x = out[1]
+    eq_bench = out[2]
+    
+    # Synthetic drag per leverage factor: borrowed cost of money plus expense ratio
+    cost_of_money = rf_rate + BROKER_SPREAD
+    drag_2x = (cost_of_money * 1) + DAILY_EXPENSE
+    drag_3x = (cost_of_money * 2) + DAILY_EXPENSE
+    e2 = e3 = eb = float(START_CAPITAL)
+    signal_prev = False # Yesterday's close vs. yesterday's SMA
+    
+    for i in range(n):
+        spy_ret = price[i] / price[i - 1] - 1.0 if i > 0 else 0.0
+        
+        if signal_prev:
+            # SPLICE: Real return, Synthetic where the ETF has no data
+            r2 = sso_real[i]
+            if np.isnan(r2):
+                r2 = spy_ret * 2 - drag_2x
+            r3 = upro_real[i]
+            if np.isnan(r3):
+                r3 = spy_ret * 3 - drag_3x
+        else:
+            r2 = r3 = rf_rate
+        
+        e2 *= 1.0 + r2
+        e3 *= 1.0 + r3
+        eb *= 1.0 + spy_ret
+        eq_2x[i] = e2
+        eq_3x[i] = e3
+        eq_bench[i] = eb
+        
+        signal_prev = price[i] > sma[i]
+
 def fetch_hybrid_data():
     print("1. Downloading Data Separately (Safer for Automation)...")
     
     # Helper to download a single ticker safely
-    def get_clean_series(ticker):
+    def get_clean_series(ticker, start='2000-01-01'):
         try:
-            print(f"   Fetching {ticker}...")
+            print(f"   Fetching {ticker} from {start}...")
             # Download single ticker (returns simple DataFrame, no MultiIndex confusion)
-            d = yf.download(ticker, start='2000-01-01', progress=False, auto_adjust=False)
+            d = yf.download(ticker, start=start, progress=False, auto_adjust=False)
             
             # Handle cases where yfinance returns a MultiIndex columns
             if isinstance(d.columns, pd.MultiIndex):
@@ -48,10 +100,49 @@ def fetch_hybrid_data():
             print(f"   Error fetching {ticker}: {e}")
             return pd.Series(dtype=float)
 
-    # 1. Fetch Series Individually
-    spy_price = get_clean_series(BENCHMARK_TICKER)
-    sso_price = get_clean_series('SSO')
-    upro_price = get_clean_series('UPRO')
+    # Helper to serve a ticker from the parquet cache, downloading only the new rows
+    def get_cached_series(ticker):
+        path = os.path.join(CACHE_DIR, f"{ticker}.parquet")
+        cached = pd.Series(dtype=float)
+        if os.path.exists(path):
+            try:
+                cached = pd.read_parquet(path)['px']
+            except Exception as e:
+                print(f"   Ignoring unreadable cache for {ticker}: {e}")
+
+        if len(cached) < 2:
+            series = get_clean_series(ticker)
+        else:
+            age_hours = (time.time() - os.path.getmtime(path)) / 3600
+            if age_hours < CACHE_TTL_HOURS:
+                print(f"   Using cached {ticker} ({age_hours:.1f}h old)")
+                return cached
+
+            # Re-fetch from the second-to-last cached day: the last row may be an
+            # intraday quote, and the overlap rebases the older adjusted prices
+            # in case a dividend went ex since the cache was written
+            anchor = cached.index[-2]
+            fresh = get_clean_series(ticker, start=anchor.strftime('%Y-%m-%d')).dropna()
+            if fresh.empty:
+                print(f"   Falling back to cached {ticker}")
+                return cached
+            if anchor not in fresh.index:
+                series = get_clean_series(ticker)
+            else:
+                scale = fresh.loc[anchor] / cached.loc[anchor]
+                series = pd.concat([cached[cached.index < anchor] * scale, fresh])
+
+        if not series.empty:
+            try:
+                os.makedirs(CACHE_DIR, exist_ok=True)
+                pd.DataFrame({'px': series}).to_parquet(path, compression='zstd')
+            except Exception as e:
+                print(f"   Could not cache {ticker}: {e}")
+        return series
+
+    # 1. Fetch Series Individually (in parallel - the downloads are network-bound)
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        spy_price, sso_price, upro_price = executor.map(get_cached_series, [BENCHMARK_TICKER, 'SSO', 'UPRO'])
     
     # Drop rows where SPY is missing (Market holidays etc)
     spy_price = spy_price.dropna()
@@ -61,34 +152,42 @@ def fetch_hybrid_data():
     df['Price'] = spy_price
     
     # Use fixed risk free rate (safer than downloading ^IRX)
-    df['RiskFree_Rate'] = FIXED_RISK_FREE_RATE / 252
+    rf_rate = FIXED_RISK_FREE_RATE / 252
     
-    # 2. Calculate Signals on BENCHMARK (SPY)
-    df['SMA'] = df['Price'].rolling(window=SMA_PERIOD).mean()
-    df['Signal'] = np.where(df['Price'].shift(1) > df['SMA'].shift(1), 1, 0)
+    # Kernel inputs live in one (4, N) block, one contiguous row per series:
+    # price, sma, sso_real, upro_real
+    inputs = np.empty((4, len(df)))
+    price, sma, sso_real, upro_real = inputs
+    price[:] = df['Price'].to_numpy(dtype=float)
     
-    # 3. Calculate Returns
-    df['SPY_Ret'] = df['Price'].pct_change().fillna(0)
-    df['SSO_Ret_Real'] = sso_price.pct_change()
-    df['UPRO_Ret_Real'] = upro_price.pct_change()
-    
-    # 4. Generate Synthetic Data (For Backfill)
-    cost_of_money = df['RiskFree_Rate'] + BROKER_SPREAD
-    df['SSO_Ret_Synth'] = (df['SPY_Ret'] * 2) - (cost_of_money * 1) - DAILY_EXPENSE
-    df['UPRO_Ret_Synth'] = (df['SPY_Ret'] * 3) - (cost_of_money * 2) - DAILY_EXPENSE
+    # 2. Calculate Signals on BENCHMARK (SPY)
+    # Running-sum SMA from bottleneck's C kernel (NaN until a full window is available)
+    if len(price) >= SMA_PERIOD:
+        sma[:] = bn.move_mean(price, window=SMA_PERIOD, min_count=SMA_PERIOD)
+    else:
+        sma[:] = np.nan # bottleneck rejects windows longer than the data
+    df['SMA'] = sma
     
-    # 5. SPLICE: Real combined with Synthetic
-    df['SSO_Final'] = df['SSO_Ret_Real'].combine_first(df['SSO_Ret_Synth'])
-    df['UPRO_Final'] = df['UPRO_Ret_Real'].combine_first(df['UPRO_Ret_Synth'])
+    # 3. Real Returns on each ETF's own dates (p[1:] / p[:-1] - 1),
+    # aligned to SPY dates (NaN before launch / on missing days)
+    for real, etf_price in ((sso_real, sso_price), (upro_real, upro_price)):
+        etf_price = etf_price.dropna()
+        p = etf_price.to_numpy(dtype=float)
+        r = np.empty_like(p)
+        r[:1] = np.nan
+        np.divide(p[1:], p[:-1], out=r[1:])
+        r[1:] -= 1.0
+        real[:] = pd.Series(r, index=etf_price.index).reindex(df.index).to_numpy()
     
-    # 6. Apply Strategy
-    df['Strat_2x'] = np.where(df['Signal'] == 1, df['SSO_Final'], df['RiskFree_Rate'])
-    df['Strat_3x'] = np.where(df['Signal'] == 1, df['UPRO_Final'], df['RiskFree_Rate'])
+    # 4-6. Signal, Synthetic Backfill, Splice, Strategy and Equity in one pass,
+    # written into a second (3, N) block: eq_2x, eq_3x, eq_bench
+    equity = np.empty((3, len(df)))
+    compute_pipeline(price, sma, sso_real, upro_real, rf_rate, equity)
     
     # Equity Curves
-    df['Eq_2x'] = START_CAPITAL * (1 + df['Strat_2x']).cumprod()
-    df['Eq_3x'] = START_CAPITAL * (1 + df['Strat_3x']).cumprod()
-    df['Eq_Bench'] = START_CAPITAL * (1 + df['SPY_Ret']).cumprod()
+    df['Eq_2x'] = equity[0]
+    df['Eq_3x'] = equity[1]
+    df['Eq_Bench'] = equity[2]
     
     # Clean up any remaining NaNs at the start
     df = df.dropna(subset=['Eq_2x', 'Eq_3x'])
@@ -101,20 +200,29 @@ def fetch_hybrid_data():
 try:
     df = fetch_hybrid_data()
     # Check if data is valid
-    if df.empty or np.isnan(df['Price'].iloc[-1]):
+    if df.empty or np.isnan(df['Price'].iat[-1]):
         print("CRITICAL ERROR: Data fetch resulted in empty or NaN values.")
         exit(1) # Fail the build so we know
 except Exception as e:
     print(f"Error: {e}")
     exit(1)
 
-# Data for Chart
+# Plain ndarray views for cheap scalar access and slicing
+price = df['Price'].to_numpy()
+sma = df['SMA'].to_numpy()
+eq2 = df['Eq_2x'].to_numpy()
+eq3 = df['Eq_3x'].to_numpy()
+eqb = df['Eq_Bench'].to_numpy()
+
+# Data for Chart (slices are views, nothing is copied)
 lookback = 750 
-mini_df = df.iloc[-lookback:].copy()
+tail_dates = df.index[-lookback:]
+tail_price = price[-lookback:]
+tail_sma = sma[-lookback:]
 
 # Metrics
-current_price = df['Price'].iloc[-1]
-current_sma = df['SMA'].iloc[-1]
+current_price = price[-1]
+current_sma = sma[-1]
 current_date = df.index[-1].strftime('%b %d, %Y')
 distance_pct = ((current_price / current_sma) - 1) * 100
 is_bullish = current_price > current_sma
@@ -128,23 +236,25 @@ status_msg = f"Price is {abs(distance_pct):.1f}% {'ABOVE' if is_bullish else 'BE
 # YTD Calculation
 current_year = df.index[-1].year
 last_year = current_year - 1
-last_year_data = df[df.index.year == last_year]
+# Base is the last close of the prior year: the row just before Jan 1 (binary search)
+base_pos = df.index.searchsorted(pd.Timestamp(year=current_year, month=1, day=1)) - 1
 
-if not last_year_data.empty:
-    base_idx = last_year_data.index[-1]
-    ytd_2x = ((df['Eq_2x'].iloc[-1] / df.loc[base_idx, 'Eq_2x']) - 1) * 100
-    ytd_3x = ((df['Eq_3x'].iloc[-1] / df.loc[base_idx, 'Eq_3x']) - 1) * 100
-    ytd_bench = ((df['Eq_Bench'].iloc[-1] / df.loc[base_idx, 'Eq_Bench']) - 1) * 100
+if base_pos >= 0 and df.index[base_pos].year == last_year:
+    ytd_2x = ((eq2[-1] / eq2[base_pos]) - 1) * 100
+    ytd_3x = ((eq3[-1] / eq3[base_pos]) - 1) * 100
+    ytd_bench = ((eqb[-1] / eqb[base_pos]) - 1) * 100
 else:
     ytd_2x = ytd_3x = ytd_bench = 0.0
 
 # JSON
+# orjson encodes the numpy arrays directly; 2-decimal prices fit comfortably in float32.
+# Dates are formatted in one numpy pass, but orjson rejects string arrays, hence .tolist()
 chart_data = {
-    "dates": mini_df.index.strftime('%Y-%m-%d').tolist(),
-    "price": np.round(mini_df['Price'].values, 2).tolist(),
-    "sma": np.round(mini_df['SMA'].values, 2).tolist(),
+    "dates": tail_dates.values.astype('datetime64[D]').astype(str).tolist(),
+    "price": np.round(tail_price, 2).astype(np.float32),
+    "sma": np.round(tail_sma, 2).astype(np.float32),
 }
-json_str = json.dumps(chart_data)
+json_str = orjson.dumps(chart_data, option=orjson.OPT_SERIALIZE_NUMPY).decode()
 
 # HTML Template
 html_template = """
@@ -243,23 +353,27 @@ html_template = """
 </html>
 """
 
-# Injection
-html_final = html_template.replace("__DATA_JSON__", json_str)
-html_final = html_final.replace("__ACCENT_COLOR__", signal_color)
-html_final = html_final.replace("__SIGNAL_TEXT__", signal_text)
-html_final = html_final.replace("__STATUS_MSG__", status_msg)
-html_final = html_final.replace("__CURRENT_DATE__", current_date)
-html_final = html_final.replace("__SMA_PERIOD__", str(SMA_PERIOD))
-html_final = html_final.replace("__PRICE__", f"{current_price:.2f}")
-
-# YTD
-html_final = html_final.replace("__YTD2X__", f"{ytd_2x:+.1f}").replace("__C2X__", "val-green" if ytd_2x >= 0 else "val-red")
-html_final = html_final.replace("__YTD3X__", f"{ytd_3x:+.1f}").replace("__C3X__", "val-green" if ytd_3x >= 0 else "val-red")
-html_final = html_final.replace("__YTDBENCH__", f"{ytd_bench:+.1f}").replace("__CBENCH__", "val-green" if ytd_bench >= 0 else "val-red")
+# Injection (single pass over the template)
+replacements = {
+    "DATA_JSON": json_str,
+    "ACCENT_COLOR": signal_color,
+    "SIGNAL_TEXT": signal_text,
+    "STATUS_MSG": status_msg,
+    "CURRENT_DATE": current_date,
+    "SMA_PERIOD": str(SMA_PERIOD),
+    "PRICE": f"{current_price:.2f}",
+    
+    # YTD
+    "YTD2X": f"{ytd_2x:+.1f}", "C2X": "val-green" if ytd_2x >= 0 else "val-red",
+    "YTD3X": f"{ytd_3x:+.1f}", "C3X": "val-green" if ytd_3x >= 0 else "val-red",
+    "YTDBENCH": f"{ytd_bench:+.1f}", "CBENCH": "val-green" if ytd_bench >= 0 else "val-red",
+}
+html_final = re.sub(r"__([A-Z0-9_]+?)__", lambda m: replacements[m.group(1)], html_template)
 
 output_file = "index.html"
-with open(output_file, "w", encoding="utf-8") as f:
-    f.write(html_final)
+payload = html_final.encode("utf-8")
+with open(output_file, "wb", buffering=0) as f:
+    f.write(payload)
 
 print(f"\nSUCCESS! App generated: {output_file}")
 # Note: webbrowser.open is REMOVED because servers don't have screens.